@@ -1,13 +1,57 @@
+import asyncio
+import json
 import os
-from typing import Any, Dict, List
+import re
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, List, Tuple
 
+import orjson
 from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
-from pydantic import BaseModel, Field
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field, ValidationError
+
+from model import merge_ranked, rank_songs_for_user, recommend_for_user
+
+
+# orjson turns integers outside 64 bits into floats; 19+ digit runs fall back to the stdlib parser.
+LONG_INTEGER_PATTERN = re.compile(rb"\d{19,}")
+
+
+def loads_json(body: bytes) -> Any:
+    # orjson for speed, json.loads whenever orjson would reject (NaN/Infinity) or alter the input.
+    if LONG_INTEGER_PATTERN.search(body) is None:
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(body)
+
+
+class ORJSONRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = loads_json(await self.body())
+        return self._json
+
+
+class ORJSONRoute(APIRoute):
+    # Decode request bodies with orjson instead of the stdlib json module.
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def orjson_handler(request: Request) -> Response:
+            return await handler(ORJSONRequest(request.scope, request.receive))
+
+        return orjson_handler
 
-from model import rank_songs_for_user, recommend_for_user
 
 app = FastAPI(title="music-ml-service", version="1.0.0")
+app.router.route_class = ORJSONRoute
 API_KEY = os.getenv("ML_SERVICE_API_KEY", "").strip()
+NDJSON_MAX_LINE_BYTES = 1 << 20
+STREAM_BATCH_SIZE = max(1, int(os.getenv("RANK_STREAM_BATCH_SIZE", "1000")))
+# Opt-in: unset or 0 scores each /rank catalog with a single rank_songs_for_user call.
+RANK_CHUNK_MIN_SONGS = max(0, int(os.getenv("RANK_CHUNK_MIN_SONGS", "0")))
 
 
 class RankRequest(BaseModel):
@@ -17,6 +61,12 @@ class RankRequest(BaseModel):
     topK: int = Field(default=10, ge=1, le=100)
 
 
+class RankStreamHeader(BaseModel):
+    userId: str
+    query: str = ""
+    topK: int = Field(default=10, ge=1, le=100)
+
+
 class RecommendRequest(BaseModel):
     userId: str
     userData: Dict[str, Any]
@@ -56,16 +106,126 @@ def verify_api_key(request: Request, x_api_key: str | None = Header(default=None
 
 
 @app.post("/rank")
-def rank_songs(req: RankRequest, _auth: None = Depends(verify_api_key)) -> Dict[str, Any]:
-    ranked = rank_songs_for_user(
-        user_id=req.userId,
-        songs=req.songs,
-        query=req.query,
-        top_k=req.topK,
+async def rank_songs(req: RankRequest, _auth: None = Depends(verify_api_key)) -> Dict[str, Any]:
+    chunks = split_catalog(req.songs)
+    if len(chunks) == 1:
+        ranked = await run_in_threadpool(
+            rank_songs_for_user,
+            user_id=req.userId,
+            songs=req.songs,
+            query=req.query,
+            top_k=req.topK,
+        )
+        return {"results": ranked}
+
+    # Chunked scoring only overlaps the NumPy stages; the per-song prepare, lexical and hash
+    # passes hold the GIL. Each chunk also takes a slot in the shared threadpool.
+    ranked_chunks = await asyncio.gather(
+        *(
+            run_in_threadpool(
+                rank_songs_for_user,
+                user_id=req.userId,
+                songs=chunk,
+                query=req.query,
+                top_k=req.topK,
+                start_index=offset,
+            )
+            for offset, chunk in chunks
+        )
     )
+    return {"results": merge_ranked(ranked_chunks, top_k=req.topK)}
+
+
+def split_catalog(songs: List[Dict[str, Any]]) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    if not RANK_CHUNK_MIN_SONGS or len(songs) <= RANK_CHUNK_MIN_SONGS:
+        return [(0, songs)]
+    workers = os.cpu_count() or 1
+    size = max(RANK_CHUNK_MIN_SONGS, -(-len(songs) // workers))
+    return [(offset, songs[offset:offset + size]) for offset in range(0, len(songs), size)]
+
+
+@app.post("/rank-stream")
+async def rank_songs_stream(request: Request, _auth: None = Depends(verify_api_key)) -> Dict[str, Any]:
+    # NDJSON body: a RankStreamHeader object on the first line, then one song object per line.
+    # Songs are ranked in batches and only the running top-K is kept between batches.
+    header: RankStreamHeader | None = None
+    ranked: List[Dict[str, Any]] = []
+    batch: List[Dict[str, Any]] = []
+    offset = 0
+
+    async for item in iter_ndjson(request):
+        if header is None:
+            try:
+                header = RankStreamHeader.model_validate(item)
+            except ValidationError as exc:
+                raise HTTPException(status_code=422, detail="Invalid stream header") from exc
+            continue
+
+        if not isinstance(item, dict):
+            raise HTTPException(status_code=422, detail="Each song line must be a JSON object")
+        batch.append(item)
+        if len(batch) >= STREAM_BATCH_SIZE:
+            ranked = await rank_stream_batch(header, ranked, batch, offset)
+            offset += len(batch)
+            batch = []
+
+    if header is None:
+        raise HTTPException(status_code=422, detail="Missing stream header")
+    if batch:
+        ranked = await rank_stream_batch(header, ranked, batch, offset)
     return {"results": ranked}
 
 
+async def rank_stream_batch(
+    header: RankStreamHeader,
+    ranked: List[Dict[str, Any]],
+    batch: List[Dict[str, Any]],
+    offset: int,
+) -> List[Dict[str, Any]]:
+    batch_ranked = await run_in_threadpool(
+        rank_songs_for_user,
+        user_id=header.userId,
+        songs=batch,
+        query=header.query,
+        top_k=header.topK,
+        start_index=offset,
+    )
+    return merge_ranked([ranked, batch_ranked], top_k=header.topK)
+
+
+async def iter_ndjson(request: Request) -> AsyncIterator[Any]:
+    # Only newly received bytes are scanned for newlines, so long lines stay linear-time.
+    buffer = bytearray()
+    async for chunk in request.stream():
+        scan_from = len(buffer)
+        buffer += chunk
+        start = 0
+        newline = buffer.find(b"\n", scan_from)
+        while newline != -1:
+            line = bytes(buffer[start:newline])
+            start = newline + 1
+            if line.strip():
+                yield parse_ndjson_line(line)
+            newline = buffer.find(b"\n", start)
+        del buffer[:start]
+        check_ndjson_line_length(len(buffer))
+    if buffer.strip():
+        yield parse_ndjson_line(bytes(buffer))
+
+
+def check_ndjson_line_length(length: int) -> None:
+    if length > NDJSON_MAX_LINE_BYTES:
+        raise HTTPException(status_code=422, detail="NDJSON line too long")
+
+
+def parse_ndjson_line(line: bytes) -> Any:
+    check_ndjson_line_length(len(line))
+    try:
+        return loads_json(line)
+    except json.JSONDecodeError as exc:
+        raise HTTPException(status_code=422, detail="Invalid NDJSON line") from exc
+
+
 @app.post("/recommend")
 def recommend(req: RecommendRequest, _auth: None = Depends(verify_api_key)) -> Dict[str, Any]:
     return recommend_for_user(
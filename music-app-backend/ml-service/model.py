@@ -1,46 +1,117 @@
 from __future__ import annotations
 
-import math
-from typing import Any, Dict, Iterable, List
+import heapq
+from dataclasses import dataclass
+from typing import AbstractSet, Any, Dict, FrozenSet, Iterable, List, NamedTuple
 
+import numpy as np
+import xxhash
+from cachetools.func import ttl_cache
 
-def rank_songs_for_user(user_id: str, songs: List[Dict[str, Any]], query: str = "", top_k: int = 10) -> List[Dict[str, Any]]:
-    normalized_query = normalize_text(query)
-    preferred_languages = {normalize_text(x) for x in coerce_list(safe_get_user_pref(user_id, "preferred_language"))}
-    preferred_artists = {normalize_text(x) for x in coerce_list(safe_get_user_pref(user_id, "preferred_artists"))}
+try:
+    from rapidfuzz import process as rf_process
+    from rapidfuzz.distance import Levenshtein as rf_levenshtein
+except ImportError:  # pragma: no cover - pure-Python fallback below
+    rf_process = None
+    rf_levenshtein = None
 
-    ranked = []
-    for index, song in enumerate(songs):
-        text_score = lexical_score(normalized_query, song)
-        popularity_score = normalize_popularity(song.get("global_popularity_score", song.get("play_count", 0)))
-        user_pref_score = preference_score(song, preferred_languages, preferred_artists)
-        interaction_score = interaction_bias(user_id, song)
-
-        # Strong lexical priority for search quality.
-        final_score = (
-            0.55 * text_score +
-            0.20 * user_pref_score +
-            0.15 * popularity_score +
-            0.10 * interaction_score
+
+class PreparedSong(NamedTuple):
+    title: str
+    artist: str
+    artist_tokens: FrozenSet[str]
+    language: str
+    popularity: float
+    song_id: str
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    preferred_languages: FrozenSet[str]
+    preferred_artists: FrozenSet[str]
+
+
+def rank_songs_for_user(
+    user_id: str,
+    songs: List[Dict[str, Any]],
+    query: str = "",
+    top_k: int = 10,
+    start_index: int = 0,
+) -> List[Dict[str, Any]]:
+    normalized_query = normalize_text(query)
+    profile = get_user_profile(user_id)
+
+    prepared_songs = prepare_songs(songs)
+    if normalized_query:
+        text = np.fromiter(
+            (lexical_score(normalized_query, prepared) for prepared in prepared_songs),
+            dtype=np.float64,
+            count=len(prepared_songs),
         )
-        if normalized_query and text_score < 0.20:
-            final_score *= 0.5
+    else:
+        # Browse traffic without a query: every song gets the neutral lexical score.
+        text = np.full(len(prepared_songs), 0.5)
+    user_pref = preference_scores(prepared_songs, profile.preferred_languages, profile.preferred_artists)
+    popularity = popularity_scores(prepared_songs)
+    interaction = interaction_scores(user_id, prepared_songs)
+    final = combine_scores(text, user_pref, popularity, interaction, bool(normalized_query))
 
+    ranked = []
+    for index in top_k_indices(final, top_k).tolist():
+        song = songs[index]
         ranked_song = {
             **song,
             "_rank": {
-                "final_score": round(final_score, 6),
-                "text_score": round(text_score, 6),
-                "preference_score": round(user_pref_score, 6),
-                "popularity_score": round(popularity_score, 6),
-                "interaction_score": round(interaction_score, 6),
-                "original_index": index,
+                "final_score": float(final[index]),
+                "text_score": float(text[index]),
+                "preference_score": float(user_pref[index]),
+                "popularity_score": float(popularity[index]),
+                "interaction_score": float(interaction[index]),
+                "original_index": start_index + index,
             },
         }
         ranked.append(ranked_song)
-
-    ranked.sort(key=lambda x: x["_rank"]["final_score"], reverse=True)
-    return ranked[: max(1, int(top_k))]
+    return ranked
+
+
+def merge_ranked(ranked_lists: Iterable[List[Dict[str, Any]]], top_k: int = 10) -> List[Dict[str, Any]]:
+    # Merge per-batch rank_songs_for_user results on the same rounded key as top_k_indices;
+    # earlier batches win ties, so the result matches a single pass over the whole catalog.
+    return heapq.nlargest(
+        max(1, int(top_k)),
+        (song for ranked in ranked_lists for song in ranked),
+        key=lambda x: np.round(x["_rank"]["final_score"], 6),
+    )
+
+
+def combine_scores(
+    text: np.ndarray,
+    user_pref: np.ndarray,
+    popularity: np.ndarray,
+    interaction: np.ndarray,
+    has_query: bool,
+) -> np.ndarray:
+    # Strong lexical priority for search quality.
+    final = 0.55 * text + 0.20 * user_pref + 0.15 * popularity + 0.10 * interaction
+    if has_query:
+        final = np.where(text < 0.20, final * 0.5, final)
+    return final
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    # O(N) selection of the k best scores. Keys are rounded to 6 decimals so float noise
+    # does not break ties; tied songs keep catalog order like a stable sort.
+    keys = np.round(scores, 6)
+    count = keys.shape[0]
+    k = min(max(1, int(top_k)), count)
+    if k < count:
+        kth = np.partition(keys, count - k)[count - k]
+        above = np.flatnonzero(keys > kth)
+        ties = np.flatnonzero(keys == kth)[: k - above.size]
+        candidates = np.concatenate((above, ties))
+    else:
+        candidates = np.arange(count)
+    return candidates[np.lexsort((candidates, -keys[candidates]))]
 
 
 def recommend_for_user(
@@ -53,29 +124,50 @@ def recommend_for_user(
     preferred_languages = {normalize_text(x) for x in coerce_list(user_data.get("preferred_language", []))}
     preferred_artists = {normalize_text(x) for x in coerce_list(user_data.get("preferred_artists", []))}
 
-    scored = []
-    for song in catalog:
-        score = preference_score(song, preferred_languages, preferred_artists)
-        score = 0.7 * score + 0.3 * normalize_popularity(song.get("global_popularity_score", song.get("play_count", 0)))
-        scored.append({**song, "_recommendation_score": round(score, 6)})
+    prepared_songs = prepare_songs(catalog)
+    scores = (
+        0.7 * preference_scores(prepared_songs, preferred_languages, preferred_artists) +
+        0.3 * popularity_scores(prepared_songs)
+    )
+    recommended = [
+        {**catalog[index], "_recommendation_score": float(scores[index])}
+        for index in top_k_indices(scores, top_k).tolist()
+    ]
 
-    scored.sort(key=lambda x: x["_recommendation_score"], reverse=True)
     return {
         "recommended_for": user_id,
         "based_on": {
             "language": sorted(preferred_languages),
             "artists": sorted(preferred_artists),
         },
-        "songs": scored[: max(1, int(top_k))],
+        "songs": recommended,
     }
 
 
-def lexical_score(query: str, song: Dict[str, Any]) -> float:
+def prepare_songs(songs: Iterable[Dict[str, Any]]) -> List[PreparedSong]:
+    # Normalize the text fields once per request instead of once per scoring function.
+    prepared = []
+    for song in songs:
+        artist = normalize_text(song.get("artist", song.get("primaryArtists", "")))
+        prepared.append(
+            PreparedSong(
+                title=normalize_text(song.get("title", song.get("name", ""))),
+                artist=artist,
+                artist_tokens=frozenset(token.strip() for token in artist.split(",") if token.strip()),
+                language=normalize_text(song.get("language", "")),
+                popularity=to_float(song.get("global_popularity_score", song.get("play_count", 0))),
+                song_id=normalize_text(str(song.get("id", ""))),
+            )
+        )
+    return prepared
+
+
+def lexical_score(query: str, song: PreparedSong) -> float:
     if not query:
         return 0.5
 
-    title = normalize_text(song.get("title", song.get("name", "")))
-    artist = normalize_text(song.get("artist", song.get("primaryArtists", "")))
+    title = song.title
+    artist = song.artist
     haystack = f"{title} {artist}".strip()
     terms = [token for token in query.split() if token]
 
@@ -92,89 +184,120 @@ def lexical_score(query: str, song: Dict[str, Any]) -> float:
         return 0.4
 
     hits = 0.0
+    tokens = None
     for term in terms:
         if term in title:
             hits += 1.0
         elif term in artist:
             hits += 0.8
         else:
-            hits += fuzzy_term_match(term, tokenize(haystack))
+            # Tokenize lazily, and only once per song, for terms that missed the substring checks.
+            if tokens is None:
+                tokens = tokenize(haystack)
+            hits += fuzzy_term_match(term, tokens)
     return clamp(hits / max(len(terms), 1), 0.0, 1.0)
 
 
-def preference_score(song: Dict[str, Any], preferred_languages: set[str], preferred_artists: set[str]) -> float:
-    language = normalize_text(song.get("language", ""))
-    artist = normalize_text(song.get("artist", song.get("primaryArtists", "")))
-
-    score = 0.35
-    if language and language in preferred_languages:
-        score += 0.3
-
-    if artist:
-        artist_tokens = [token.strip() for token in artist.split(",") if token.strip()]
-        for token in artist_tokens:
-            if token in preferred_artists:
-                score += 0.35
-                break
-
-    return clamp(score, 0.0, 1.0)
-
-
-def interaction_bias(user_id: str, song: Dict[str, Any]) -> float:
+def preference_scores(
+    songs: List[PreparedSong],
+    preferred_languages: AbstractSet[str],
+    preferred_artists: AbstractSet[str],
+) -> np.ndarray:
+    # Base 0.35, +0.3 for a preferred language, +0.35 for a preferred artist.
+    count = len(songs)
+    language_hit = np.fromiter(
+        (bool(song.language) and song.language in preferred_languages for song in songs),
+        dtype=bool,
+        count=count,
+    )
+    artist_hit = np.fromiter(
+        (bool(song.artist_tokens & preferred_artists) for song in songs),
+        dtype=bool,
+        count=count,
+    )
+    return np.clip(0.35 + 0.30 * language_hit + 0.35 * artist_hit, 0.0, 1.0)
+
+
+def interaction_scores(user_id: str, songs: List[PreparedSong]) -> np.ndarray:
     # Deterministic pseudo-personalization fallback before trained model is loaded.
-    song_id = normalize_text(str(song.get("id", "")))
-    seed = abs(hash(f"{user_id}:{song_id}")) % 1000
-    return seed / 1000.0
+    # xxh64 is stable across processes, unlike the salted built-in hash().
+    prefix = f"{user_id}:".encode()
+    seeds = np.fromiter(
+        (xxhash.xxh64_intdigest(prefix + song.song_id.encode()) % 1000 for song in songs),
+        dtype=np.float64,
+        count=len(songs),
+    )
+    return seeds / 1000.0
 
 
-def normalize_popularity(value: Any) -> float:
-    try:
-        raw = float(value)
-    except (TypeError, ValueError):
-        raw = 0.0
-
-    if raw <= 0:
-        return 0.3
-    return clamp(math.log10(raw + 1) / 2.5, 0.0, 1.0)
+def popularity_scores(songs: List[PreparedSong]) -> np.ndarray:
+    # log10 scale saturating at ~316 plays; missing or non-positive counts get a neutral 0.3.
+    raw = np.fromiter((song.popularity for song in songs), dtype=np.float64, count=len(songs))
+    scaled = np.clip(np.log10(np.maximum(raw, 0.0) + 1.0) / 2.5, 0.0, 1.0)
+    return np.where(raw > 0, scaled, 0.3)
 
 
 def fuzzy_term_match(term: str, tokens: Iterable[str]) -> float:
+    max_distance = 2 if len(term) >= 7 else 1
+    if rf_process is not None:
+        # Bit-parallel distance in C with early exit once max_distance is exceeded.
+        match = rf_process.extractOne(
+            term,
+            [token for token in tokens if token],
+            scorer=rf_levenshtein.distance,
+            score_cutoff=max_distance,
+        )
+        return 0.55 if match is not None else 0.0
+
     for token in tokens:
         if not token:
             continue
-        max_distance = 2 if len(term) >= 7 else 1
-        if abs(len(term) - len(token)) > max_distance:
-            continue
-        if levenshtein(term, token) <= max_distance:
+        if levenshtein(term, token, max_distance) <= max_distance:
             return 0.55
     return 0.0
 
 
-def levenshtein(a: str, b: str) -> int:
+def levenshtein(a: str, b: str, max_distance: int | None = None) -> int:
+    # Banded DP over a single rolling row; returns max_distance + 1 once the bound is exceeded.
     if a == b:
         return 0
-    if not a:
-        return len(b)
+    if len(a) < len(b):
+        a, b = b, a
+
+    limit = len(a) if max_distance is None else max(0, int(max_distance))
+    over = limit + 1
+    if len(a) - len(b) > limit:
+        return over
     if not b:
         return len(a)
 
-    rows = len(a) + 1
     cols = len(b) + 1
-    dp = [[0 for _ in range(cols)] for _ in range(rows)]
-    for i in range(rows):
-        dp[i][0] = i
-    for j in range(cols):
-        dp[0][j] = j
-
-    for i in range(1, rows):
-        for j in range(1, cols):
-            cost = 0 if a[i - 1] == b[j - 1] else 1
-            dp[i][j] = min(
-                dp[i - 1][j] + 1,
-                dp[i][j - 1] + 1,
-                dp[i - 1][j - 1] + cost,
-            )
-    return dp[-1][-1]
+    row = [j if j <= limit else over for j in range(cols)]
+    for i in range(1, len(a) + 1):
+        char = a[i - 1]
+        lo = max(1, i - limit)
+        hi = min(cols - 1, i + limit)
+
+        diag = row[lo - 1]
+        if lo == 1:
+            left = min(i, over)
+        else:
+            left = over
+        row[lo - 1] = left
+
+        row_min = left
+        for j in range(lo, hi + 1):
+            up = row[j]
+            value = min(up + 1, left + 1, diag + (char != b[j - 1]), over)
+            diag = up
+            row[j] = value
+            left = value
+            if value < row_min:
+                row_min = value
+
+        if row_min > limit:
+            return over
+    return row[-1]
 
 
 def tokenize(text: str) -> List[str]:
@@ -185,6 +308,13 @@ def normalize_text(value: Any) -> str:
     return str(value or "").strip().lower()
 
 
+def to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
 def coerce_list(value: Any) -> List[str]:
     if value is None:
         return []
@@ -193,6 +323,19 @@ def coerce_list(value: Any) -> List[str]:
     return [str(value)]
 
 
+@ttl_cache(maxsize=10_000, ttl=60)
+def get_user_profile(user_id: str) -> UserProfile:
+    # Cached per user so repeated /rank calls within the TTL skip the preference lookup.
+    return UserProfile(
+        preferred_languages=frozenset(
+            normalize_text(x) for x in coerce_list(safe_get_user_pref(user_id, "preferred_language"))
+        ),
+        preferred_artists=frozenset(
+            normalize_text(x) for x in coerce_list(safe_get_user_pref(user_id, "preferred_artists"))
+        ),
+    )
+
+
 def safe_get_user_pref(_user_id: str, _key: str) -> List[str]:
     # Replace with cache/feature store lookup once model serving is added.
     return []